@@ -0,0 +1,143 @@
+import os
+import atexit
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+POOL_SIZE = 4
+# Files with idle connections kept open; the least recently used is closed beyond this
+MAX_POOLED_PATHS = int(os.getenv("MAX_POOLED_PATHS", "32"))
+
+
+class ConnectionPool:
+    """Keeps a few open, pre-tuned connections per user database file"""
+
+    def __init__(self, size=POOL_SIZE, max_paths=MAX_POOLED_PATHS):
+        self.size = size
+        self.max_paths = max_paths
+        self._pools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _connect(self, path):
+        conn = sqlite3.connect(path, timeout=20.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA cache_size = -64000")
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _get_queue(self, path):
+        evicted = []
+        with self._lock:
+            q = self._pools.get(path)
+            if q is None:
+                q = self._pools[path] = queue.LifoQueue(maxsize=self.size)
+                while len(self._pools) > self.max_paths:
+                    evicted.append(self._pools.popitem(last=False)[1])
+            else:
+                self._pools.move_to_end(path)
+        # Borrowed connections of an evicted path are closed when released
+        for old in evicted:
+            self._drain(old)
+        return q
+
+    def _drain(self, q):
+        while True:
+            try:
+                self._close(q.get_nowait())
+            except queue.Empty:
+                break
+
+    @contextmanager
+    def acquire(self, path):
+        path = os.path.abspath(path)
+        q = self._get_queue(path)
+        try:
+            conn = q.get_nowait()
+        except queue.Empty:
+            conn = self._connect(path)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            # Connections for a discarded path (or beyond pool size) are closed
+            with self._lock:
+                keep = self._pools.get(path) is q
+            try:
+                if not keep:
+                    raise queue.Full
+                q.put_nowait(conn)
+            except queue.Full:
+                self._close(conn)
+
+    def checkpoint(self, path):
+        """Fold the WAL back into the main file, e.g. before serving it"""
+        if not os.path.exists(path):
+            return
+        with self.acquire(path) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close_path(self, path):
+        """Close idle connections for a file that is about to be removed"""
+        path = os.path.abspath(path)
+        with self._lock:
+            q = self._pools.pop(path, None)
+        if q is not None:
+            self._drain(q)
+
+    def close_all(self):
+        with self._lock:
+            paths = list(self._pools)
+        for path in paths:
+            self.close_path(path)
+
+
+def file_version(path):
+    """mtime/size of the database and its WAL, which changes on every write"""
+    st = os.stat(path)
+    try:
+        wal = os.stat(path + "-wal")
+        return (st.st_mtime_ns, st.st_size, wal.st_mtime_ns, wal.st_size)
+    except FileNotFoundError:
+        return (st.st_mtime_ns, st.st_size, 0, 0)
+
+
+@contextmanager
+def bulk_load(path):
+    """Connection for filling a freshly created database file in one transaction.
+
+    Journaling and fsync are off because a failed load simply deletes the file;
+    once committed the file is switched to WAL to match pooled connections.
+    """
+    conn = sqlite3.connect(path, timeout=20.0)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -200000")
+        conn.execute("BEGIN")
+        yield conn
+        conn.commit()
+        conn.execute("PRAGMA journal_mode = WAL")
+    except Exception:
+        conn.close()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    conn.close()
+
+
+user_db_pool = ConnectionPool()
+atexit.register(user_db_pool.close_all)
@@ -1,14 +1,38 @@
 import sqlite3
 import os
+import asyncio
 import json
+import threading
+import weakref
+from contextlib import contextmanager
 from datetime import datetime
 from threading import Lock
 
+# Bump when adding a migration step to initialize_system_db
+SCHEMA_VERSION = 5
+
+class _ConnectionHolder:
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
 class DatabaseManager:
     _instance = None
     _lock = Lock()
 
     def __new__(cls):
+        # Fast path: skip the lock once the singleton exists
+        if cls._instance is not None:
+            return cls._instance
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(DatabaseManager, cls).__new__(cls)
@@ -19,6 +43,8 @@ class DatabaseManager:
         if self._initialized:
             return
         self.system_db_path = os.getenv("SYSTEM_DB_PATH", "./data/system.db")
+        # One long-lived connection per thread instead of connect/close per query
+        self._local = threading.local()
         self._ensure_dirs()
         self._initialized = True
 
@@ -27,9 +53,19 @@ class DatabaseManager:
         os.makedirs("./uploads/databases", exist_ok=True)
 
     def get_system_db(self):
-        conn = sqlite3.connect(self.system_db_path, timeout=20.0)
-        conn.row_factory = sqlite3.Row
-        return conn
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = sqlite3.connect(self.system_db_path, timeout=20.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.execute("PRAGMA cache_size = -20000")
+            holder = self._local.holder = _ConnectionHolder(conn)
+            # The thread-local holds the only reference, so the connection is
+            # closed when its worker thread exits (or at interpreter exit)
+            weakref.finalize(holder, _close_quietly, conn)
+        return holder.conn
 
     def get_user_db(self, db_path):
         conn = sqlite3.connect(db_path, timeout=20.0)
@@ -38,114 +74,159 @@ class DatabaseManager:
 
     def run_system_query(self, query, params=()):
         conn = self.get_system_db()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        last_id = cursor.lastrowid
-        changes = conn.total_changes
-        conn.commit()
-        conn.close()
-        return {"lastID": last_id, "changes": changes}
+        with conn:
+            cursor = conn.execute(query, params)
+        return {"lastID": cursor.lastrowid, "changes": cursor.rowcount}
 
-    def get_system_row(self, query, params=()):
+    def run_system_many(self, query, seq_of_params):
         conn = self.get_system_db()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        row = cursor.fetchone()
-        conn.close()
+        with conn:
+            cursor = conn.executemany(query, seq_of_params)
+        return {"changes": cursor.rowcount}
+
+    @contextmanager
+    def tx(self):
+        """Cursor inside one BEGIN IMMEDIATE transaction; commits on exit, rolls back on error"""
+        conn = self.get_system_db()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn.cursor()
+
+    def run_system_transaction(self, statements):
+        """Run several (query, params) statements atomically with one commit"""
+        changes = 0
+        with self.tx() as cursor:
+            for query, params in statements:
+                changes += cursor.execute(query, params).rowcount
+        return {"changes": changes}
+
+    def get_system_row(self, query, params=()):
+        row = self.get_system_db().execute(query, params).fetchone()
         return dict(row) if row else None
 
     def get_system_rows(self, query, params=()):
-        conn = self.get_system_db()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        rows = self.get_system_db().execute(query, params).fetchall()
         return [dict(r) for r in rows]
 
+    # Async variants run the blocking sqlite call in a worker thread so the
+    # event loop stays free; each worker thread reuses its own connection.
+    async def arun_system_query(self, query, params=()):
+        return await asyncio.to_thread(self.run_system_query, query, params)
+
+    async def aget_system_row(self, query, params=()):
+        return await asyncio.to_thread(self.get_system_row, query, params)
+
+    async def aget_system_rows(self, query, params=()):
+        return await asyncio.to_thread(self.get_system_rows, query, params)
+
     def initialize_system_db(self):
         conn = self.get_system_db()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+
         cursor = conn.cursor()
-        
-        # Database Optimization
-        cursor.execute("PRAGMA foreign_keys = ON")
-        cursor.execute("PRAGMA journal_mode = WAL")
-        cursor.execute("PRAGMA synchronous = NORMAL")
-
-        # Users
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                email_verified INTEGER DEFAULT 0,
-                reset_token TEXT,
-                reset_token_expiry DATETIME,
-                otp TEXT,
-                otp_expiry DATETIME
-            )
-        """)
-
-        # Databases
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS databases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                original_filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                owner_id INTEGER NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-
-        # Database Permissions
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS database_permissions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                database_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                permission_level TEXT NOT NULL CHECK(permission_level IN ('owner', 'editor', 'viewer')),
-                granted_by INTEGER NOT NULL,
-                granted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY (granted_by) REFERENCES users(id),
-                UNIQUE(database_id, user_id)
-            )
-        """)
-
-        # Commits
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS commits (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                database_id INTEGER NOT NULL,
-                user_id INTEGER NOT NULL,
-                commit_message TEXT,
-                query_executed TEXT NOT NULL,
-                affected_tables TEXT,
-                rows_affected INTEGER DEFAULT 0,
-                operation_type TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-
-        # Schema Cache
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS schema_cache (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                database_id INTEGER NOT NULL,
-                schema_json TEXT NOT NULL,
-                cached_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE
-            )
-        """)
 
+        if version < 1:
+            # Users
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    email TEXT UNIQUE NOT NULL,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    email_verified INTEGER DEFAULT 0,
+                    reset_token TEXT,
+                    reset_token_expiry DATETIME,
+                    otp TEXT,
+                    otp_expiry DATETIME
+                )
+            """)
+
+            # Databases
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS databases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    original_filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    owner_id INTEGER NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (owner_id) REFERENCES users(id) ON DELETE CASCADE
+                )
+            """)
+
+            # Database Permissions
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS database_permissions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    database_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    permission_level TEXT NOT NULL CHECK(permission_level IN ('owner', 'editor', 'viewer')),
+                    granted_by INTEGER NOT NULL,
+                    granted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY (granted_by) REFERENCES users(id),
+                    UNIQUE(database_id, user_id)
+                )
+            """)
+
+            # Commits
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS commits (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    database_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    commit_message TEXT,
+                    query_executed TEXT NOT NULL,
+                    affected_tables TEXT,
+                    rows_affected INTEGER DEFAULT 0,
+                    operation_type TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            """)
+
+            # Schema Cache
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    database_id INTEGER NOT NULL,
+                    schema_json TEXT NOT NULL,
+                    cached_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (database_id) REFERENCES databases(id) ON DELETE CASCADE
+                )
+            """)
+
+        if version < 2:
+            # Keep only the latest schema_cache row per database, then enforce it
+            cursor.execute("""
+                DELETE FROM schema_cache
+                WHERE id NOT IN (SELECT MAX(id) FROM schema_cache GROUP BY database_id)
+            """)
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_schema_cache_database_id ON schema_cache(database_id)")
+
+        if version < 3:
+            # History is read newest-first per database; the index avoids a full sort
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_commits_db_ts ON commits(database_id, timestamp DESC)")
+
+        if version < 4:
+            # Version of the database file the cached schema was read from
+            cursor.execute("ALTER TABLE schema_cache ADD COLUMN file_version TEXT")
+
+        if version < 5:
+            # Lookup paths: reset-token checks, per-database operation counts, and
+            # listing a user's own and shared databases
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_reset_token ON users(reset_token) WHERE reset_token IS NOT NULL")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_commits_db_op ON commits(database_id, operation_type)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_database_permissions_user_db ON database_permissions(user_id, database_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_databases_owner ON databases(owner_id)")
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
-        conn.close()
 
 db_manager = DatabaseManager()
 db_manager.initialize_system_db()
@@ -1,14 +1,25 @@
 import os
+import re
+import io
+import csv
+import sys
 import shutil
 import uuid
-import json
+import asyncio
+import time
+import hashlib
+import functools
 import logging
+import threading
+from collections import OrderedDict
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, Body, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, Body, Form, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, FileResponse
 import jwt
 import bcrypt
 from pydantic import BaseModel, EmailStr
@@ -17,16 +28,26 @@ import socketio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import random
-import string
+import secrets
+import orjson
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
 
 from database_manager import db_manager
+from connection_pool import user_db_pool, bulk_load, file_version as _file_version
 from services.premium_nlp_service import premium_nlp_service
 
 # Configuration
 load_dotenv()
 JWT_SECRET = os.getenv("JWT_SECRET", "super-secret-key")
 JWT_ALGORITHM = "HS256"
+# Verified tokens are remembered briefly so repeat requests skip jwt.decode
+JWT_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "60"))
+JWT_CACHE_SIZE = 10000
+# bcrypt cost factor; lower it for CI/load tests, raise it on faster hardware
+BCRYPT_ROUNDS = min(max(int(os.getenv("BCRYPT_ROUNDS", "10")), 4), 15)
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads/databases")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -36,7 +57,36 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASS = os.getenv("SMTP_PASS", "")
 
+def _json_dumps(obj) -> str:
+    """Serialize schema JSON with orjson's C encoder"""
+    return orjson.dumps(obj).decode("utf-8")
+
+def _json_loads(data):
+    return orjson.loads(data)
+
+def _orjson_default(obj):
+    # BLOB columns come back as bytes; return them as text rather than failing
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return bytes(obj).decode("utf-8", "replace")
+    raise TypeError
+
+class RowsResponse(ORJSONResponse):
+    """Encodes raw DB rows straight to JSON, bypassing jsonable_encoder when returned directly"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
+
+# One logged-in SMTP session is reused across emails; it is reopened when the server drops it
+_smtp_server = None
+_smtp_lock = threading.Lock()
+
+def _smtp_connect():
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+    server.starttls()
+    server.login(SMTP_USER, SMTP_PASS)
+    return server
+
 def send_email(to_email, subject, body):
+    global _smtp_server
     if not SMTP_USER or not SMTP_PASS:
         logging.warning(f"SMTP not configured. Email to {to_email} skipped. Body: {body}")
         return False
@@ -47,11 +97,20 @@ def send_email(to_email, subject, body):
         msg['Subject'] = subject
         msg.attach(MIMEText(body, 'plain'))
         
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASS)
-        server.send_message(msg)
-        server.quit()
+        with _smtp_lock:
+            if _smtp_server is not None:
+                try:
+                    _smtp_server.send_message(msg)
+                    return True
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError):
+                    # Idle session timed out; fall through and reconnect
+                    try:
+                        _smtp_server.close()
+                    except Exception:
+                        pass
+                    _smtp_server = None
+            _smtp_server = _smtp_connect()
+            _smtp_server.send_message(msg)
         return True
     except Exception as e:
         logging.error(f"SMTP Error: {e}")
@@ -74,7 +133,7 @@ def verify_gmail_credentials(email, password):
         logging.error(f"Gmail Verification Error: {e}")
         return False, "Verification failed. Please ensure you are using a valid Gmail account."
 
-api_app = FastAPI(title="CollabSQL API")
+api_app = FastAPI(title="CollabSQL API", default_response_class=ORJSONResponse)
 
 # Setup CORS
 api_app.add_middleware(
@@ -85,6 +144,10 @@ api_app.add_middleware(
     allow_headers=["*"],
 )
 
+@api_app.on_event("shutdown")
+async def _shutdown():
+    await _flush_commits()
+
 # Socket.io Setup
 sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
 app = socketio.ASGIApp(sio, api_app)
@@ -122,31 +185,81 @@ class ResetPassword(BaseModel):
     newPassword: str
 
 # Auth Middleware
+_jwt_cache = OrderedDict()  # sha256(token) -> (payload, cache_expiry)
+_jwt_cache_lock = threading.Lock()
+
 async def get_current_user(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
     
     token = auth_header.split(" ")[1]
+    cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+    now = time.time()
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(cache_key)
+        if cached and cached[1] > now:
+            _jwt_cache.move_to_end(cache_key)
+            return cached[0]
+
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Only valid tokens are cached, and never past their own expiry
+    cache_expiry = now + JWT_CACHE_TTL
+    if isinstance(payload.get("exp"), (int, float)):
+        cache_expiry = min(cache_expiry, payload["exp"])
+    with _jwt_cache_lock:
+        _jwt_cache[cache_key] = (payload, cache_expiry)
+        _jwt_cache.move_to_end(cache_key)
+        while len(_jwt_cache) > JWT_CACHE_SIZE:
+            _jwt_cache.popitem(last=False)
+    return payload
+
 # --- AUTH ROUTES ---
 
+# bcrypt releases the GIL while hashing, so a thread per core runs hashes in parallel
+# without tying up the default executor used by asyncio.to_thread
+bcrypt_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="bcrypt")
+
+async def _hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(bcrypt_pool, bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS))
+    return hashed.decode('utf-8')
+
+async def _check_password(password: str, password_hash: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bcrypt_pool, bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+# Checked against when the email is unknown so failed logins take as long as real ones
+_DUMMY_HASH = bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+def _hash_cost(password_hash: str) -> int:
+    # Hashes look like $2b$NN$<salt+digest>
+    try:
+        return int(password_hash[4:6])
+    except ValueError:
+        return 0
+
+async def _upgrade_password_hash(user_id: int, password: str):
+    try:
+        hashed_password = await _hash_password(password)
+        await db_manager.arun_system_query("UPDATE users SET password_hash = ? WHERE id = ?", (hashed_password, user_id))
+    except Exception as e:
+        logging.warning(f"Failed to upgrade password hash: {e}")
+
 @api_app.post("/api/auth/register")
-def register(user: UserRegister):
-    existing = db_manager.get_system_row("SELECT id FROM users WHERE email = ? OR username = ?", (user.email, user.username))
+async def register(user: UserRegister):
+    existing = await db_manager.aget_system_row("SELECT id FROM users WHERE email = ? OR username = ?", (user.email, user.username))
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
     
-    # Using 10 rounds for better performance while maintaining high security
-    hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt(10)).decode('utf-8')
-    result = db_manager.run_system_query(
+    hashed_password = await _hash_password(user.password)
+    result = await db_manager.arun_system_query(
         "INSERT INTO users (email, username, password_hash, email_verified) VALUES (?, ?, ?, 1)",
         (user.email, user.username, hashed_password)
     )
@@ -161,7 +274,7 @@ def register(user: UserRegister):
     }
 
 @api_app.post("/api/auth/verify-gmail")
-async def verify_gmail(data: GmailVerify):
+def verify_gmail(data: GmailVerify):
     if not data.email.endswith("@gmail.com"):
         raise HTTPException(status_code=400, detail="Only Gmail addresses are supported for this verification step.")
     
@@ -172,13 +285,13 @@ async def verify_gmail(data: GmailVerify):
     return {"message": "Gmail verified successfully"}
 
 @api_app.post("/api/auth/forgot-password")
-async def forgot_password(data: ForgotPassword):
+def forgot_password(data: ForgotPassword, background_tasks: BackgroundTasks):
     user = db_manager.get_system_row("SELECT id FROM users WHERE email = ?", (data.email,))
     if not user:
         # Don't reveal if user exists for security, but return success
         return {"message": "If an account exists with this email, a reset link has been sent."}
     
-    token = ''.join(random.choices(string.ascii_letters + string.digits, k=40))
+    token = secrets.token_urlsafe(30)
     expiry = (datetime.now() + timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
     
     db_manager.run_system_query(
@@ -189,21 +302,22 @@ async def forgot_password(data: ForgotPassword):
     reset_url = f"http://localhost:3000/auth?token={token}" # Adjust for production
     body = f"Hello,\n\nPlease click the following link to reset your CollabSQL password:\n{reset_url}\n\nThis link expires in 1 hour."
     
-    send_email(data.email, "Reset your CollabSQL Password", body)
+    # Sent after the response so the request doesn't wait on the SMTP session
+    background_tasks.add_task(send_email, data.email, "Reset your CollabSQL Password", body)
     
     return {"message": "Reset instructions sent to your email."}
 
 @api_app.post("/api/auth/reset-password")
-def reset_password(data: ResetPassword):
-    user = db_manager.get_system_row(
+async def reset_password(data: ResetPassword):
+    user = await db_manager.aget_system_row(
         "SELECT id FROM users WHERE reset_token = ? AND reset_token_expiry > CURRENT_TIMESTAMP",
         (data.token,)
     )
     if not user:
         raise HTTPException(status_code=400, detail="Invalid or expired reset token")
     
-    hashed_password = bcrypt.hashpw(data.newPassword.encode('utf-8'), bcrypt.gensalt(10)).decode('utf-8')
-    db_manager.run_system_query(
+    hashed_password = await _hash_password(data.newPassword)
+    await db_manager.arun_system_query(
         "UPDATE users SET password_hash = ?, reset_token = NULL, reset_token_expiry = NULL WHERE id = ?",
         (hashed_password, user["id"])
     )
@@ -211,10 +325,15 @@ def reset_password(data: ResetPassword):
     return {"message": "Password reset successful. You can now log in."}
 
 @api_app.post("/api/auth/login")
-def login(user_data: UserLogin):
-    user = db_manager.get_system_row("SELECT * FROM users WHERE email = ?", (user_data.email,))
-    if not user or not bcrypt.checkpw(user_data.password.encode('utf-8'), user["password_hash"].encode('utf-8')):
+async def login(user_data: UserLogin, background_tasks: BackgroundTasks):
+    user = await db_manager.aget_system_row("SELECT * FROM users WHERE email = ?", (user_data.email,))
+    password_hash = user["password_hash"] if user else _DUMMY_HASH
+    if not await _check_password(user_data.password, password_hash) or not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+
+    # Hashes made under an older, lower BCRYPT_ROUNDS are upgraded after the response
+    if _hash_cost(user["password_hash"]) < BCRYPT_ROUNDS:
+        background_tasks.add_task(_upgrade_password_hash, user["id"], user_data.password)
     
     token_payload = {"userId": user["id"], "email": user["email"], "username": user["username"]}
     token = jwt.encode(token_payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -225,15 +344,19 @@ def login(user_data: UserLogin):
         "token": token
     }
 
+async def _user_from_claims(current_user: dict, fresh: bool):
+    # The token already carries id/email/username; only hit the DB when asked to
+    if fresh:
+        return await db_manager.aget_system_row("SELECT id, email, username FROM users WHERE id = ?", (current_user["userId"],))
+    return {"id": current_user["userId"], "email": current_user["email"], "username": current_user["username"]}
+
 @api_app.get("/api/auth/me")
-async def get_me(current_user: dict = Depends(get_current_user)):
-    user = db_manager.get_system_row("SELECT id, email, username FROM users WHERE id = ?", (current_user["userId"],))
-    return {"user": user}
+async def get_me(fresh: bool = False, current_user: dict = Depends(get_current_user)):
+    return {"user": await _user_from_claims(current_user, fresh)}
 
 @api_app.get("/api/auth/verify")
-def verify_token(current_user: dict = Depends(get_current_user)):
-    user = db_manager.get_system_row("SELECT id, email, username FROM users WHERE id = ?", (current_user["userId"],))
-    return {"valid": True, "user": user}
+async def verify_token(fresh: bool = False, current_user: dict = Depends(get_current_user)):
+    return {"valid": True, "user": await _user_from_claims(current_user, fresh)}
 
 @api_app.post("/api/auth/logout")
 async def logout_user():
@@ -241,6 +364,164 @@ async def logout_user():
 
 # --- DATABASE ROUTES ---
 
+def _qid(name: str) -> str:
+    """Quote an SQLite identifier, escaping embedded double quotes"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+def _save_upload(src, dst_path: str):
+    """Write an uploaded file to disk, kernel-to-kernel via sendfile when possible"""
+    with open(dst_path, "wb") as dst:
+        # Starlette spools small uploads in memory; only a rolled-over file has a real fd
+        if sys.platform.startswith("linux") and getattr(src, "_rolled", True):
+            try:
+                src_fd = src.fileno()
+                offset = src.tell()
+                size = os.fstat(src_fd).st_size
+                if size > offset:
+                    os.posix_fallocate(dst.fileno(), 0, size - offset)
+                while offset < size:
+                    sent = os.sendfile(dst.fileno(), src_fd, offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                src.seek(offset)
+                return
+            except (AttributeError, OSError):
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+
+def _import_csv(src, dst_path: str, table_name: str):
+    """Stream a CSV upload into a new SQLite table, decoding as UTF-8 or else Latin-1"""
+    for encoding in ("utf-8", "latin-1"):
+        src.seek(0)
+        stream = io.TextIOWrapper(src, encoding=encoding, newline="")
+        try:
+            _load_csv(stream, dst_path, table_name)
+            return
+        except UnicodeDecodeError:
+            # Latin-1 decodes any byte sequence, so this only retries once
+            continue
+        finally:
+            # Leave the upload's own file object open for Starlette to close
+            stream.detach()
+
+def _load_csv(stream, dst_path: str, table_name: str):
+    reader = csv.reader(stream)
+    headers = next(reader, None)
+    if headers is None:
+        raise HTTPException(status_code=400, detail="CSV file is empty")
+    
+    # Sanitize headers for SQLite
+    sanitized_headers = [h.strip().replace(" ", "_").replace("-", "_") for h in headers]
+    
+    # Create SQLite database from CSV
+    with bulk_load(dst_path) as conn:
+        cursor = conn.cursor()
+
+        # Create table
+        cols = ", ".join([f'{_qid(h)} TEXT' for h in sanitized_headers])
+        cursor.execute(f'CREATE TABLE {_qid(table_name)} ({cols})')
+
+        # Insert data; executemany pulls rows from the stream as it goes
+        placeholders = ", ".join(["?" for _ in sanitized_headers])
+        cursor.executemany(f'INSERT INTO {_qid(table_name)} VALUES ({placeholders})', reader)
+
+EXCEL_SAMPLE_ROWS = 1000
+
+def _excel_column_type(values) -> str:
+    """SQLite column type for a sample of cell values, mirroring pandas' to_sql mapping"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return "TEXT"
+    if all(isinstance(v, int) for v in values):
+        return "INTEGER"
+    if all(isinstance(v, (int, float)) for v in values):
+        return "REAL"
+    if all(isinstance(v, datetime) for v in values):
+        return "TIMESTAMP"
+    return "TEXT"
+
+def _excel_cell(value):
+    # Dates, times and durations are stored as text, like pandas does
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+def _import_xlsx(src_path: str, dst_path: str):
+    """Stream every sheet of a workbook into its own table, row by row"""
+    wb = load_workbook(src_path, read_only=True, data_only=True)
+    try:
+        with bulk_load(dst_path) as conn:
+            _load_worksheets(wb, conn.cursor())
+    finally:
+        wb.close()
+
+def _load_worksheets(wb, cursor):
+    for ws in wb.worksheets:
+        rows = ws.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if not header_row:
+            continue
+
+        # Name blank and repeated headers the way pandas does
+        headers = []
+        seen = {}
+        for i, h in enumerate(header_row):
+            h = f"Unnamed: {i}" if h is None else str(h)
+            if h in seen:
+                seen[h] += 1
+                h = f"{h}.{seen[h]}"
+            else:
+                seen[h] = 0
+            headers.append(h)
+        width = len(headers)
+
+        # Ragged rows are padded or cut to the header width; fully blank rows are dropped
+        rows = (
+            (r + (None,) * (width - len(r)))[:width]
+            for r in rows if any(v is not None for v in r)
+        )
+
+        # Column types come from a sample of leading rows
+        sample = list(islice(rows, EXCEL_SAMPLE_ROWS))
+        col_types = [_excel_column_type([r[i] for r in sample]) for i in range(width)]
+
+        table_name = ws.title.strip().replace(" ", "_").replace("-", "_")
+        if not table_name: table_name = "data"
+
+        cols = ", ".join(f"{_qid(h)} {t}" for h, t in zip(headers, col_types))
+        cursor.execute(f"DROP TABLE IF EXISTS {_qid(table_name)}")
+        cursor.execute(f"CREATE TABLE {_qid(table_name)} ({cols})")
+        placeholders = ", ".join(["?"] * width)
+        cursor.executemany(
+            f"INSERT INTO {_qid(table_name)} VALUES ({placeholders})",
+            (tuple(map(_excel_cell, r)) for r in chain(sample, rows))
+        )
+
+def _import_xls(pd, src_path: str, dst_path: str):
+    """Convert each sheet of a legacy workbook to a table through pandas.
+
+    to_sql commits after every sheet, so a multi-sheet file is not one
+    transaction; bulk_load still deletes the file if any sheet fails, and with
+    synchronous off those commits cost no fsync.
+    """
+    with pd.ExcelFile(src_path) as excel_file, bulk_load(dst_path) as conn:
+        for sheet_name in excel_file.sheet_names:
+            df = pd.read_excel(excel_file, sheet_name=sheet_name)
+
+            # Sanitize table name
+            table_name = sheet_name.strip().replace(" ", "_").replace("-", "_")
+            if not table_name: table_name = "data"
+
+            # Write to SQLite
+            df.to_sql(table_name, conn, if_exists='replace', index=False)
+
 @api_app.post("/api/database/upload")
 async def upload_database(name: str = Form(...), file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     file_ext = os.path.splitext(file.filename)[1].lower()
@@ -253,42 +534,26 @@ async def upload_database(name: str = Form(...), file: UploadFile = File(...), c
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     if file_ext == ".csv":
-        import csv
-        import sqlite3
-        import io
-        
-        # Read CSV content
-        content = await file.read()
-        try:
-            stream = io.StringIO(content.decode('utf-8'))
-        except UnicodeDecodeError:
-            stream = io.StringIO(content.decode('latin-1'))
-        
-        reader = csv.reader(stream)
-        headers = next(reader)
-        
-        # Sanitize headers for SQLite
-        sanitized_headers = [h.strip().replace(" ", "_").replace("-", "_") for h in headers]
         table_name = os.path.splitext(file.filename)[0].strip().replace(" ", "_").replace("-", "_")
         if not table_name: table_name = "data"
+        await asyncio.to_thread(_import_csv, file.file, file_path, table_name)
+    
+    elif file_ext == ".xlsx":
+        if load_workbook is None:
+            raise HTTPException(status_code=500, detail="Excel support not available. Please install openpyxl.")
         
-        # Create SQLite database from CSV
-        conn = sqlite3.connect(file_path)
-        cursor = conn.cursor()
-        
-        # Create table
-        cols = ", ".join([f'"{h}" TEXT' for h in sanitized_headers])
-        cursor.execute(f'CREATE TABLE "{table_name}" ({cols})')
-        
-        # Insert data
-        placeholders = ", ".join(["?" for _ in sanitized_headers])
-        cursor.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', reader)
-        
-        conn.commit()
-        conn.close()
+        # Save uploaded file temporarily
+        temp_path = os.path.join(UPLOAD_DIR, f"temp_{uuid.uuid4()}{file_ext}")
+        await asyncio.to_thread(_save_upload, file.file, temp_path)
+        try:
+            await asyncio.to_thread(_import_xlsx, temp_path, file_path)
+        finally:
+            # Clean up temp file
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
     
-    elif file_ext in [".xlsx", ".xls"]:
-        import sqlite3
+    elif file_ext == ".xls":
+        # Legacy .xls is only readable through pandas (xlrd)
         try:
             import pandas as pd
         except ImportError:
@@ -296,178 +561,423 @@ async def upload_database(name: str = Form(...), file: UploadFile = File(...), c
         
         # Save uploaded file temporarily
         temp_path = os.path.join(UPLOAD_DIR, f"temp_{uuid.uuid4()}{file_ext}")
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await asyncio.to_thread(_save_upload, file.file, temp_path)
         
         try:
-            # Read Excel file
-            excel_file = pd.ExcelFile(temp_path)
-            
-            # Create SQLite database
-            conn = sqlite3.connect(file_path)
-            
-            # Convert each sheet to a table
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(temp_path, sheet_name=sheet_name)
-                
-                # Sanitize table name
-                table_name = sheet_name.strip().replace(" ", "_").replace("-", "_")
-                if not table_name: table_name = "data"
-                
-                # Write to SQLite
-                df.to_sql(table_name, conn, if_exists='replace', index=False)
-            
-            conn.close()
+            await asyncio.to_thread(_import_xls, pd, temp_path, file_path)
         finally:
             # Clean up temp file
             if os.path.exists(temp_path):
                 os.remove(temp_path)
     
     else:
-        # Standard SQLite file upload
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Standard SQLite file upload; check the magic header before copying anything
+        header = await file.read(len(SQLITE_HEADER))
+        if header != SQLITE_HEADER:
+            raise HTTPException(status_code=400, detail="Not a valid SQLite database file")
+        await file.seek(0)
+        await asyncio.to_thread(_save_upload, file.file, file_path)
     
-    result = db_manager.run_system_query(
-        "INSERT INTO databases (name, original_filename, file_path, owner_id) VALUES (?, ?, ?, ?)",
-        (name, file.filename, file_path, current_user["userId"])
-    )
-    
-    # Extract schema and cache it
-    try:
-        import sqlite3
-        conn = sqlite3.connect(file_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        schema = {"tables": []}
-        for table_name in tables:
-            cursor.execute(f"PRAGMA table_info(\"{table_name}\")")
-            columns = [{"name": r[1], "type": r[2], "notNull": bool(r[3]), "primaryKey": bool(r[5])} for r in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT COUNT(*) FROM \"{table_name}\"")
-            row_count = cursor.fetchone()[0]
-            
-            schema["tables"].append({
-                "name": table_name,
-                "columns": columns,
-                "rowCount": row_count
-            })
-        conn.close()
-        
-        db_manager.run_system_query(
-            "INSERT INTO schema_cache (database_id, schema_json) VALUES (?, ?)",
-            (result["lastID"], json.dumps(schema))
-        )
-    except Exception as e:
-        print(f"Schema extraction error: {e}")
+    database_id = await asyncio.to_thread(_register_database, name, file.filename, file_path, current_user["userId"])
 
-    return {"id": result["lastID"], "name": name, "message": "Database uploaded successfully"}
+    return {"id": database_id, "name": name, "message": "Database uploaded successfully"}
 
 @api_app.get("/api/database/list")
-async def list_databases(current_user: dict = Depends(get_current_user)):
-    # Get databases owned by the user
-    own_databases = db_manager.get_system_rows(
-        "SELECT *, 'owner' as user_role FROM databases WHERE owner_id = ?",
-        (current_user["userId"],)
-    )
-    
-    # Get databases where the user is a collaborator but NOT the owner
-    collaborated_databases = db_manager.get_system_rows(
+def list_databases(current_user: dict = Depends(get_current_user)):
+    # Owned databases and ones shared with the user (but NOT owned) in one statement;
+    # is_own tells the two halves apart
+    rows = db_manager.get_system_rows(
         """
-        SELECT d.*, dp.permission_level as user_role, u.username as owner_username
+        SELECT d.*, 'owner' as user_role, NULL as owner_username, 1 as is_own
+        FROM databases d
+        WHERE d.owner_id = ?1
+        UNION ALL
+        SELECT d.*, dp.permission_level as user_role, u.username as owner_username, 0 as is_own
         FROM databases d
         JOIN database_permissions dp ON d.id = dp.database_id
         JOIN users u ON d.owner_id = u.id
-        WHERE dp.user_id = ? AND d.owner_id != ?
+        WHERE dp.user_id = ?1 AND d.owner_id != ?1
         """,
-        (current_user["userId"], current_user["userId"])
+        (current_user["userId"],)
     )
     
+    own_databases = []
+    collaborated_databases = []
+    for row in rows:
+        if row.pop("is_own"):
+            del row["owner_username"]
+            own_databases.append(row)
+        else:
+            collaborated_databases.append(row)
+    
     return {
         "databases": own_databases,
         "collaborated": collaborated_databases
     }
 
 
-def _extract_schema(file_path: str) -> dict:
-    """Helper to extract schema from a SQLite database file"""
-    import sqlite3
-    schema = {"tables": []}
-    try:
-        conn = sqlite3.connect(file_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = [row[0] for row in cursor.fetchall()]
+# Declared column types that analytics treats as numeric
+_NUMERIC_TYPE_RE = re.compile(r"INT|FLOAT|DECIMAL|NUMERIC|REAL|DOUBLE", re.IGNORECASE)
 
-        for table_name in tables:
-            cursor.execute(f'PRAGMA table_info("{table_name}")')
-            columns = [{"name": r[1], "type": r[2], "notNull": bool(r[3]), "primaryKey": bool(r[5])} for r in cursor.fetchall()]
 
-            cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
-            row_count = cursor.fetchone()[0]
+# Extracted schemas keyed by file path, valid while the file's version is unchanged
+SCHEMA_MEMO_SIZE = 256
+_schema_memo = OrderedDict()  # file_path -> (file_version, schema)
+_schema_memo_lock = threading.Lock()
 
-            schema["tables"].append({
-                "name": table_name,
-                "columns": columns,
-                "rowCount": row_count
-            })
-        conn.close()
+
+def _invalidate_schema_memo(file_path: str):
+    with _schema_memo_lock:
+        _schema_memo.pop(file_path, None)
+
+
+def _extract_schema(file_path: str, analyze: bool = False) -> tuple:
+    """Helper to extract schema from a SQLite database file.
+
+    Returns (schema, file version read before the scan). The version is None
+    when the file could not be read; a write racing the scan leaves the file
+    newer than that version, so the schema is never recorded as current for it.
+
+    Row counts come from COUNT(*) per table. Pass analyze=True only after a
+    bulk load: it runs ANALYZE and takes the counts from the fresh sqlite_stat1
+    instead, which later writes would leave stale.
+    """
+    try:
+        version = _file_version(file_path)
+    except OSError:
+        version = None
+    if version is not None and not analyze:
+        with _schema_memo_lock:
+            cached = _schema_memo.get(file_path)
+            if cached and cached[0] == version:
+                _schema_memo.move_to_end(file_path)
+                return cached[1], version
+
+    schema = {"tables": []}
+    try:
+        with user_db_pool.acquire(file_path) as conn:
+            cursor = conn.cursor()
+            if analyze:
+                cursor.execute("ANALYZE")
+                conn.commit()
+                # ANALYZE itself wrote to the file
+                version = _file_version(file_path)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+            tables = [row[0] for row in cursor.fetchall()]
+
+            # Leading integer of each sqlite_stat1.stat is the row count;
+            # a partial index can report fewer rows, so keep the largest
+            stat_counts = {}
+            if analyze:
+                cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+                for tbl, stat in cursor.fetchall():
+                    if stat:
+                        count = int(stat.split(" ", 1)[0])
+                        stat_counts[tbl] = max(count, stat_counts.get(tbl, 0))
+
+            for table_name in tables:
+                quoted = _qid(table_name)
+                cursor.execute(f'PRAGMA table_info({quoted})')
+                columns = [
+                    {"name": r[1], "type": r[2], "notNull": bool(r[3]), "primaryKey": bool(r[5]), "is_numeric": bool(_NUMERIC_TYPE_RE.search(r[2]))}
+                    for r in cursor.fetchall()
+                ]
+
+                row_count = stat_counts.get(table_name)
+                if row_count is None:
+                    cursor.execute(f'SELECT COUNT(*) FROM {quoted}')
+                    row_count = cursor.fetchone()[0]
+
+                schema["tables"].append({
+                    "name": table_name,
+                    "columns": columns,
+                    "rowCount": row_count
+                })
     except Exception as e:
         logging.warning(f"Could not extract schema from {file_path}: {e}")
         # If it's a CSV or other file, we might return an empty schema for now
         # Future: Add CSV parsing logic here
-    return schema
+        return schema, None
 
+    if version is not None:
+        with _schema_memo_lock:
+            _schema_memo[file_path] = (version, schema)
+            _schema_memo.move_to_end(file_path)
+            while len(_schema_memo) > SCHEMA_MEMO_SIZE:
+                _schema_memo.popitem(last=False)
+    return schema, version
 
-@api_app.get("/api/database/{database_id}")
-async def get_database_details(database_id: int, current_user: dict = Depends(get_current_user)):
-    db = db_manager.get_system_row(
-        "SELECT d.*, u.username as owner_username FROM databases d JOIN users u ON d.owner_id = u.id WHERE d.id = ?",
-        (database_id,)
+
+# schema_cache holds one row per database; REPLACE swaps it in place
+SCHEMA_CACHE_UPSERT = "INSERT OR REPLACE INTO schema_cache (database_id, schema_json, file_version) VALUES (?, ?, ?)"
+
+
+def _save_schema_cache(database_id: int, schema: dict, file_version: Optional[str] = None):
+    db_manager.run_system_query(SCHEMA_CACHE_UPSERT, (database_id, _json_dumps(schema), file_version))
+    _invalidate_schema_cache(database_id)
+
+
+@functools.lru_cache(maxsize=256)
+def _parsed_schema(schema_cache_id: int) -> Optional[dict]:
+    # Every save REPLACEs the row under a new id, so an id always names the same JSON.
+    # Callers share the returned dict and must not mutate it.
+    schema_row = db_manager.get_system_row(
+        "SELECT schema_json FROM schema_cache WHERE id = ?",
+        (schema_cache_id,)
     )
-    if not db:
-        raise HTTPException(status_code=404, detail="Database not found")
+    return _json_loads(schema_row["schema_json"]) if schema_row else None
+
+
+# Parsed schema per database for hot read paths; saves in this process invalidate it,
+# and the TTL bounds staleness from writes made by other workers
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", "30"))
+_schema_by_db = OrderedDict()  # database_id -> (expiry, schema)
+_schema_by_db_lock = threading.Lock()
+_schema_by_db_gen = 0  # bumped on every invalidation
+
+
+def _invalidate_schema_cache(database_id: int):
+    global _schema_by_db_gen
+    with _schema_by_db_lock:
+        _schema_by_db.pop(database_id, None)
+        _schema_by_db_gen += 1
+
+
+def _load_schema_cache(database_id: int) -> Optional[dict]:
+    now = time.monotonic()
+    with _schema_by_db_lock:
+        cached = _schema_by_db.get(database_id)
+        if cached and cached[0] > now:
+            _schema_by_db.move_to_end(database_id)
+            return cached[1]
+        gen = _schema_by_db_gen
 
-    # Get schema
     schema_row = db_manager.get_system_row(
-        "SELECT schema_json FROM schema_cache WHERE database_id = ? ORDER BY cached_at DESC LIMIT 1",
+        "SELECT id FROM schema_cache WHERE database_id = ?",
         (database_id,)
     )
+    schema = _parsed_schema(schema_row["id"]) if schema_row else None
+    if schema is not None:
+        with _schema_by_db_lock:
+            # Skip the store if a save raced with this lookup
+            if gen == _schema_by_db_gen:
+                _schema_by_db[database_id] = (now + SCHEMA_CACHE_TTL, schema)
+                _schema_by_db.move_to_end(database_id)
+                while len(_schema_by_db) > SCHEMA_MEMO_SIZE:
+                    _schema_by_db.popitem(last=False)
+    return schema
 
-    schema = None
-    if schema_row:
-        schema = json.loads(schema_row["schema_json"])
-    elif os.path.exists(db["file_path"]):
-        schema = _extract_schema(db["file_path"])
-        db_manager.run_system_query(
-            "INSERT INTO schema_cache (database_id, schema_json) VALUES (?, ?)",
-            (database_id, json.dumps(schema))
+
+def _version_str(version: Optional[tuple]) -> Optional[str]:
+    return ":".join(map(str, version)) if version is not None else None
+
+
+def _stored_file_version(file_path: str) -> Optional[str]:
+    try:
+        return _version_str(_file_version(file_path))
+    except OSError:
+        return None
+
+
+def _extract_and_cache_schema(database_id: int, file_path: str, analyze: bool = False) -> dict:
+    """Extract a schema and store it in schema_cache within one worker-thread call.
+
+    Without analyze, a cached row recorded against the file's current version is
+    reused as is, so an unchanged file is never rescanned (even after a restart).
+    """
+    if not analyze:
+        version = _stored_file_version(file_path)
+        row = db_manager.get_system_row(
+            "SELECT id, file_version FROM schema_cache WHERE database_id = ?",
+            (database_id,)
         )
+        if version is not None and row and row["file_version"] == version:
+            schema = _parsed_schema(row["id"])
+            if schema is not None:
+                return schema
 
-    # Get collaborators
-    collaborators = db_manager.get_system_rows(
-        "SELECT dp.*, u.username, u.email FROM database_permissions dp JOIN users u ON dp.user_id = u.id WHERE dp.database_id = ?",
-        (database_id,)
+    schema, version = _extract_schema(file_path, analyze)
+    _save_schema_cache(database_id, schema, _version_str(version))
+    return schema
+
+
+def _register_database(name: str, original_filename: str, file_path: str, owner_id: int) -> int:
+    """Record an uploaded file and its schema with a single system DB commit"""
+    schema, version = _extract_schema(file_path, True)
+    with db_manager.tx() as cursor:
+        cursor.execute(
+            "INSERT INTO databases (name, original_filename, file_path, owner_id) VALUES (?, ?, ?, ?)",
+            (name, original_filename, file_path, owner_id)
+        )
+        database_id = cursor.lastrowid
+        cursor.execute(SCHEMA_CACHE_UPSERT, (database_id, _json_dumps(schema), _version_str(version)))
+    return database_id
+
+
+def _refresh_schema_cache(database_id: int, file_path: str):
+    try:
+        _extract_and_cache_schema(database_id, file_path)
+    except Exception as e:
+        logging.warning(f"Failed to refresh schema cache: {e}")
+
+
+COMMIT_INSERT = "INSERT INTO commits (database_id, user_id, query_executed, rows_affected, operation_type) VALUES (?, ?, ?, ?, ?)"
+
+
+# History rows are buffered and written in batches, one executemany per flush
+COMMIT_QUEUE_SIZE = 10000
+COMMIT_BATCH_SIZE = 500
+COMMIT_FLUSH_INTERVAL = 0.05
+_commit_queue: Optional[asyncio.Queue] = None
+_commit_drainer: Optional[asyncio.Task] = None
+
+
+def _write_commits(batch):
+    try:
+        db_manager.run_system_many(COMMIT_INSERT, batch)
+    except Exception as e:
+        logging.warning(f"Failed to record {len(batch)} commits: {e}")
+
+
+def _take_commits(batch):
+    while len(batch) < COMMIT_BATCH_SIZE:
+        try:
+            batch.append(_commit_queue.get_nowait())
+        except asyncio.QueueEmpty:
+            break
+    return batch
+
+
+async def _drain_commits():
+    while True:
+        batch = [await _commit_queue.get()]
+        if batch[0] is not None:
+            # Let concurrent writes pile up so they share one transaction
+            await asyncio.sleep(COMMIT_FLUSH_INTERVAL)
+        _take_commits(batch)
+        rows = [row for row in batch if row is not None]
+        if rows:
+            await asyncio.to_thread(_write_commits, rows)
+        if len(rows) < len(batch):
+            # Stop sentinel from _flush_commits, seen only after the batch is written
+            return
+
+
+def _queue_commit(database_id: int, user_id: int, query: str, changes: int, op_type: str):
+    """Buffer a history row; must be called from the event loop"""
+    global _commit_queue, _commit_drainer
+    if _commit_queue is None:
+        _commit_queue = asyncio.Queue(maxsize=COMMIT_QUEUE_SIZE)
+    if _commit_drainer is None or _commit_drainer.done():
+        _commit_drainer = asyncio.create_task(_drain_commits())
+    row = (database_id, user_id, query, changes, op_type)
+    try:
+        _commit_queue.put_nowait(row)
+    except asyncio.QueueFull:
+        # Backlogged: write this one directly rather than drop it
+        asyncio.get_running_loop().run_in_executor(None, _write_commits, [row])
+
+
+async def _flush_commits():
+    if _commit_drainer is not None and not _commit_drainer.done():
+        await _commit_queue.put(None)
+        await _commit_drainer
+    while _commit_queue is not None and not _commit_queue.empty():
+        await asyncio.to_thread(_write_commits, _take_commits([]))
+
+
+# Blocking sqlite work for user databases; async handlers run these via asyncio.to_thread
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "10000"))
+FETCH_BATCH_SIZE = 1024
+
+
+def _fetch_dicts(cursor, max_rows: int) -> tuple:
+    """Build row dicts batch by batch; returns (rows, truncated)"""
+    if cursor.description is None:
+        return [], False
+    columns = tuple(col[0] for col in cursor.description)
+    cursor.arraysize = FETCH_BATCH_SIZE
+    rows = []
+    while len(rows) <= max_rows:
+        batch = cursor.fetchmany()
+        if not batch:
+            return rows, False
+        rows.extend(dict(zip(columns, r)) for r in batch)
+    del rows[max_rows:]
+    return rows, True
+
+
+def _run_select(file_path: str, query: str) -> tuple:
+    with user_db_pool.acquire(file_path) as conn:
+        cursor = conn.cursor()
+        # Plain tuples; dicts are built from cursor.description once per batch
+        cursor.row_factory = None
+        cursor.execute(query)
+        return _fetch_dicts(cursor, MAX_RESULT_ROWS)
+
+
+def _run_write(file_path: str, query: str) -> int:
+    with user_db_pool.acquire(file_path) as conn:
+        # total_changes is cumulative on a pooled connection
+        changes_before = conn.total_changes
+        cursor = conn.cursor()
+        cursor.execute(query)
+        changes = conn.total_changes - changes_before
+        conn.commit()
+        return changes
+
+
+def _fetch_sample(file_path: str, table_name: str, limit: int) -> list:
+    # A negative LIMIT is SQLite's "no limit"; either way stay within the result cap
+    if limit < 0 or limit > MAX_RESULT_ROWS:
+        limit = MAX_RESULT_ROWS
+    with user_db_pool.acquire(file_path) as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f'SELECT * FROM {_qid(table_name)} LIMIT ?', (limit,))
+        rows, _ = _fetch_dicts(cursor, limit)
+        return rows
+
+
+@api_app.get("/api/database/{database_id}")
+async def get_database_details(database_id: int, current_user: dict = Depends(get_current_user)):
+    # Database, owner, cached schema and the caller's permission in one query
+    db = await db_manager.aget_system_row(
+        """
+        SELECT d.*, u.username as owner_username, sc.id as schema_cache_id, dp.permission_level
+        FROM databases d
+        JOIN users u ON d.owner_id = u.id
+        LEFT JOIN schema_cache sc ON sc.database_id = d.id
+        LEFT JOIN database_permissions dp ON dp.database_id = d.id AND dp.user_id = ?
+        WHERE d.id = ?
+        """,
+        (current_user["userId"], database_id)
     )
+    if not db:
+        raise HTTPException(status_code=404, detail="Database not found")
 
     # Determine user permission
-    user_permission = None
     if db["owner_id"] == current_user["userId"]:
         user_permission = "owner"
+    elif db["permission_level"]:
+        user_permission = db["permission_level"]
     else:
-        perm_row = db_manager.get_system_row(
-            "SELECT permission_level FROM database_permissions WHERE database_id = ? AND user_id = ?",
-            (database_id, current_user["userId"])
-        )
-        if perm_row:
-            user_permission = perm_row["permission_level"]
-        else:
-            raise HTTPException(status_code=403, detail="You do not have permission to access this database")
+        raise HTTPException(status_code=403, detail="You do not have permission to access this database")
 
-    return {
+    # Get schema
+    schema = None
+    if db["schema_cache_id"]:
+        schema = await asyncio.to_thread(_parsed_schema, db["schema_cache_id"])
+    if schema is None and os.path.exists(db["file_path"]):
+        schema = await asyncio.to_thread(_extract_and_cache_schema, database_id, db["file_path"])
+
+    # Get collaborators
+    collaborators = await db_manager.aget_system_rows(
+        "SELECT dp.*, u.username, u.email FROM database_permissions dp JOIN users u ON dp.user_id = u.id WHERE dp.database_id = ?",
+        (database_id,)
+    )
+
+    return RowsResponse({
         "database": {
             "id": db["id"],
             "name": db["name"],
@@ -479,51 +989,39 @@ async def get_database_details(database_id: int, current_user: dict = Depends(ge
             "collaborators": collaborators,
             "userPermission": user_permission
         }
-    }
+    })
 
 
 @api_app.get("/api/database/{database_id}/schema")
 async def get_database_schema(database_id: int, refresh: bool = False, current_user: dict = Depends(get_current_user)):
-    db = db_manager.get_system_row("SELECT file_path FROM databases WHERE id = ?", (database_id,))
+    db = await db_manager.aget_system_row("SELECT file_path FROM databases WHERE id = ?", (database_id,))
     if not db:
         raise HTTPException(status_code=404, detail="Database not found")
 
     if not refresh:
-        schema_row = db_manager.get_system_row(
-            "SELECT schema_json FROM schema_cache WHERE database_id = ? ORDER BY cached_at DESC LIMIT 1",
-            (database_id,)
-        )
-        if schema_row:
-            return {"schema": json.loads(schema_row["schema_json"])}
+        schema = await asyncio.to_thread(_load_schema_cache, database_id)
+        if schema is not None:
+            return {"schema": schema}
 
-    schema = _extract_schema(db["file_path"])
-    db_manager.run_system_query(
-        "INSERT INTO schema_cache (database_id, schema_json) VALUES (?, ?)",
-        (database_id, json.dumps(schema))
-    )
+    schema = await asyncio.to_thread(_extract_and_cache_schema, database_id, db["file_path"])
     return {"schema": schema}
 
 
 @api_app.get("/api/database/{database_id}/analytics")
 async def get_database_analytics(database_id: int, current_user: dict = Depends(get_current_user)):
     # 1. Basic Schema Information
-    db_row = db_manager.get_system_row("SELECT file_path, name FROM databases WHERE id = ?", (database_id,))
+    db_row = await db_manager.aget_system_row("SELECT file_path, name FROM databases WHERE id = ?", (database_id,))
     if not db_row:
         raise HTTPException(status_code=404, detail="Database not found")
 
-    schema_row = db_manager.get_system_row(
-        "SELECT schema_json FROM schema_cache WHERE database_id = ? ORDER BY cached_at DESC LIMIT 1",
-        (database_id,)
-    )
-    
-    if not schema_row:
+    schema = await asyncio.to_thread(_load_schema_cache, database_id)
+    if schema is None:
         return {"summary": {"tableCount": 0, "tables": []}}
     
-    schema = json.loads(schema_row["schema_json"])
     tables = schema.get("tables", [])
     
     # 2. Mutation Activity Distribution
-    mutation_stats = db_manager.get_system_rows(
+    mutation_stats = await db_manager.aget_system_rows(
         "SELECT operation_type, COUNT(*) as count FROM commits WHERE database_id = ? GROUP BY operation_type",
         (database_id,)
     )
@@ -536,94 +1034,7 @@ async def get_database_analytics(database_id: int, current_user: dict = Depends(
             mutations[op] = row["count"]
 
     # 3. Calculate Global Column Distribution
-    total_numeric = 0
-    total_text = 0
-    detailed_tables = []
-
-    import sqlite3
-    conn = sqlite3.connect(db_row["file_path"])
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    for table in tables:
-        table_name = table["name"]
-        row_count = table["rowCount"]
-        cols = table["columns"]
-        
-        table_stats = {
-            "name": table_name,
-            "rowCount": row_count,
-            "columnCount": len(cols),
-            "numericCount": 0,
-            "textCount": 0,
-            "avgNullPercent": 0,
-            "columns": [],
-            "numeric_stats": [],
-            "categorical_stats": []
-        }
-
-        null_sums = 0
-        
-        for col in cols:
-            col_name = col["name"]
-            col_type = col["type"].upper()
-            is_numeric = any(t in col_type for t in ["INT", "FLOAT", "DECIMAL", "NUMERIC", "REAL", "DOUBLE"])
-            
-            if is_numeric:
-                table_stats["numericCount"] += 1
-                total_numeric += 1
-            else:
-                table_stats["textCount"] += 1
-                total_text += 1
-
-            # Get distinct and Null info
-            try:
-                cursor.execute(f'SELECT COUNT(DISTINCT "{col_name}"), COUNT(*) - COUNT("{col_name}") FROM "{table_name}"')
-                row_res = cursor.fetchone()
-                distinct_count = row_res[0]
-                null_count = row_res[1]
-                null_percent = round((null_count / row_count * 100), 1) if row_count > 0 else 0
-                null_sums += null_percent
-                
-                table_stats["columns"].append({
-                    "name": col_name,
-                    "type": col_type,
-                    "distinct": distinct_count,
-                    "nullPercent": null_percent,
-                    "category": "Numeric" if is_numeric else "Text",
-                    "constraint": "PK" if col.get("primaryKey") else "-"
-                })
-
-                # Detailed Numeric Stats
-                if is_numeric and row_count > 0:
-                    cursor.execute(f'SELECT MIN("{col_name}"), MAX("{col_name}"), AVG("{col_name}"), SUM("{col_name}") FROM "{table_name}" WHERE "{col_name}" IS NOT NULL')
-                    num_res = cursor.fetchone()
-                    table_stats["numeric_stats"].append({
-                        "name": col_name,
-                        "min": num_res[0],
-                        "max": num_res[1],
-                        "avg": round(num_res[2], 2) if num_res[2] else 0,
-                        "sum": num_res[3],
-                        "distinct": distinct_count
-                    })
-                
-                # Detailed Categorical Stats
-                if not is_numeric and row_count > 0 and distinct_count > 0:
-                    cursor.execute(f'SELECT "{col_name}", COUNT(*) as freq FROM "{table_name}" GROUP BY "{col_name}" ORDER BY freq DESC LIMIT 5')
-                    top_vals = [dict(r) for r in cursor.fetchall()]
-                    table_stats["categorical_stats"].append({
-                        "name": col_name,
-                        "distinct": distinct_count,
-                        "top_values": top_vals
-                    })
-
-            except Exception as e:
-                print(f"Stats Error for {table_name}.{col_name}: {e}")
-
-        table_stats["avgNullPercent"] = round(null_sums / len(cols), 1) if cols else 0
-        detailed_tables.append(table_stats)
-
-    conn.close()
+    detailed_tables, total_numeric, total_text = await asyncio.to_thread(_column_analytics, db_row["file_path"], tables)
 
     return {
         "summary": {
@@ -639,64 +1050,224 @@ async def get_database_analytics(database_id: int, current_user: dict = Depends(
     }
 
 
+def _column_analytics(file_path: str, tables: list) -> tuple:
+    """Per-table column statistics; returns (detailed_tables, total_numeric, total_text)"""
+    total_numeric = 0
+    total_text = 0
+    detailed_tables = []
+
+    with user_db_pool.acquire(file_path) as conn:
+        cursor = conn.cursor()
+        for table in tables:
+            detailed_tables.append(_table_analytics(cursor, table))
+            total_numeric += detailed_tables[-1]["numericCount"]
+            total_text += detailed_tables[-1]["textCount"]
+
+    return detailed_tables, total_numeric, total_text
+
+
+def _table_analytics(cursor, table: dict) -> dict:
+    table_name = table["name"]
+    qtable = _qid(table_name)
+    row_count = table["rowCount"]
+    cols = table["columns"]
+    
+    table_stats = {
+        "name": table_name,
+        "rowCount": row_count,
+        "columnCount": len(cols),
+        "numericCount": 0,
+        "textCount": 0,
+        "avgNullPercent": 0,
+        "columns": [],
+        "numeric_stats": [],
+        "categorical_stats": []
+    }
+
+    # All per-column aggregates in a single scan of the table: distinct and null
+    # counts for every column, plus MIN/MAX/AVG/SUM for numeric ones
+    numeric = []
+    select_list = []  # aggregate expressions of each column
+    for col in cols:
+        is_numeric = col.get("is_numeric")
+        if is_numeric is None:
+            # Schemas cached before is_numeric existed
+            is_numeric = bool(_NUMERIC_TYPE_RE.search(col["type"]))
+        numeric.append(is_numeric)
+        qcol = _qid(col["name"])
+        exprs = f"COUNT(DISTINCT {qcol}), COUNT(*) - COUNT({qcol})"
+        if is_numeric:
+            exprs += f", MIN({qcol}), MAX({qcol}), AVG({qcol}), SUM({qcol})"
+            table_stats["numericCount"] += 1
+        else:
+            table_stats["textCount"] += 1
+        select_list.append(exprs)
+
+    if not cols:
+        return table_stats
+
+    # Per-column aggregate tuples; None for a column whose stats failed
+    col_aggs = []
+    try:
+        cursor.execute(f'SELECT {", ".join(select_list)} FROM {qtable}')
+        agg = cursor.fetchone()
+        pos = 0
+        for is_numeric in numeric:
+            width = 6 if is_numeric else 2
+            col_aggs.append(agg[pos:pos + width])
+            pos += width
+    except Exception as e:
+        print(f"Stats Error for {table_name}: {e}")
+        # Fall back to one query per column so a bad column loses only its own stats
+        for col, exprs in zip(cols, select_list):
+            try:
+                cursor.execute(f'SELECT {exprs} FROM {qtable}')
+                col_aggs.append(cursor.fetchone())
+            except Exception as e:
+                print(f"Stats Error for {table_name}.{col['name']}: {e}")
+                col_aggs.append(None)
+
+    null_sums = 0
+    categorical = []
+    for col, is_numeric, col_agg in zip(cols, numeric, col_aggs):
+        if col_agg is None:
+            continue
+        col_name = col["name"]
+        distinct_count, null_count = col_agg[0], col_agg[1]
+        null_percent = round((null_count / row_count * 100), 1) if row_count > 0 else 0
+        null_sums += null_percent
+        
+        table_stats["columns"].append({
+            "name": col_name,
+            "type": col["type"].upper(),
+            "distinct": distinct_count,
+            "nullPercent": null_percent,
+            "category": "Numeric" if is_numeric else "Text",
+            "constraint": "PK" if col.get("primaryKey") else "-"
+        })
+
+        # Detailed Numeric Stats
+        if is_numeric:
+            col_min, col_max, col_avg, col_sum = col_agg[2:6]
+            if row_count > 0:
+                table_stats["numeric_stats"].append({
+                    "name": col_name,
+                    "min": col_min,
+                    "max": col_max,
+                    "avg": round(col_avg, 2) if col_avg else 0,
+                    "sum": col_sum,
+                    "distinct": distinct_count
+                })
+        
+        # Detailed Categorical Stats
+        elif row_count > 0 and distinct_count > 0:
+            categorical.append((col_name, distinct_count))
+
+    if categorical:
+        # Top 5 values of every text column in one round trip: group each column,
+        # stack the groups, then rank within each column
+        grouped = " UNION ALL ".join(
+            f"SELECT {i} AS colidx, {_qid(name)} AS value, COUNT(*) AS freq FROM {qtable} GROUP BY {_qid(name)}"
+            for i, (name, _) in enumerate(categorical)
+        )
+        try:
+            cursor.execute(f"""
+                WITH grouped AS ({grouped}),
+                ranked AS (
+                    SELECT colidx, value, freq, ROW_NUMBER() OVER (PARTITION BY colidx ORDER BY freq DESC) AS rn
+                    FROM grouped
+                )
+                SELECT colidx, value, freq FROM ranked WHERE rn <= 5 ORDER BY colidx, rn
+            """)
+            top_vals = [[] for _ in categorical]
+            for colidx, value, freq in cursor.fetchall():
+                top_vals[colidx].append({categorical[colidx][0]: value, "freq": freq})
+        except Exception as e:
+            print(f"Stats Error for {table_name}: {e}")
+            # Per-column fallback; a failing column is left out
+            top_vals = []
+            for col_name, _ in categorical:
+                try:
+                    cursor.execute(f"SELECT {_qid(col_name)}, COUNT(*) AS freq FROM {qtable} GROUP BY {_qid(col_name)} ORDER BY freq DESC LIMIT 5")
+                    top_vals.append([{col_name: value, "freq": freq} for value, freq in cursor.fetchall()])
+                except Exception as e:
+                    print(f"Stats Error for {table_name}.{col_name}: {e}")
+                    top_vals.append(None)
+        for (col_name, distinct_count), values in zip(categorical, top_vals):
+            if values is None:
+                continue
+            table_stats["categorical_stats"].append({
+                "name": col_name,
+                "distinct": distinct_count,
+                "top_values": values
+            })
+
+    table_stats["avgNullPercent"] = round(null_sums / len(cols), 1) if cols else 0
+    return table_stats
+
+
 
 @api_app.get("/api/database/{database_id}/download")
-async def download_database(database_id: int, current_user: dict = Depends(get_current_user)):
-    from fastapi.responses import FileResponse
+def download_database(database_id: int, current_user: dict = Depends(get_current_user)):
     db = db_manager.get_system_row("SELECT file_path, original_filename FROM databases WHERE id = ?", (database_id,))
     if not db:
         raise HTTPException(status_code=404, detail="Database not found")
+    # Pooled connections run in WAL mode; fold pending pages into the file first
+    user_db_pool.checkpoint(db["file_path"])
     return FileResponse(path=db["file_path"], filename=db["original_filename"], media_type="application/x-sqlite3")
 
 
 @api_app.delete("/api/database/{database_id}")
-async def delete_database(database_id: int, current_user: dict = Depends(get_current_user)):
+def delete_database(database_id: int, current_user: dict = Depends(get_current_user)):
     db = db_manager.get_system_row("SELECT * FROM databases WHERE id = ? AND owner_id = ?", (database_id, current_user["userId"]))
     if not db:
         raise HTTPException(status_code=404, detail="Database not found or not owned by you")
 
-    if os.path.exists(db["file_path"]):
-        os.remove(db["file_path"])
+    user_db_pool.close_path(db["file_path"])
+    _invalidate_schema_memo(db["file_path"])
+    for path in (db["file_path"], db["file_path"] + "-wal", db["file_path"] + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
-    db_manager.run_system_query("DELETE FROM schema_cache WHERE database_id = ?", (database_id,))
-    db_manager.run_system_query("DELETE FROM commits WHERE database_id = ?", (database_id,))
-    db_manager.run_system_query("DELETE FROM database_permissions WHERE database_id = ?", (database_id,))
-    db_manager.run_system_query("DELETE FROM databases WHERE id = ?", (database_id,))
+    db_manager.run_system_transaction([
+        ("DELETE FROM schema_cache WHERE database_id = ?", (database_id,)),
+        ("DELETE FROM commits WHERE database_id = ?", (database_id,)),
+        ("DELETE FROM database_permissions WHERE database_id = ?", (database_id,)),
+        ("DELETE FROM databases WHERE id = ?", (database_id,)),
+    ])
+    _invalidate_schema_cache(database_id)
 
     return {"message": "Database deleted successfully"}
 
 
 @api_app.get("/api/database/{database_id}/table/{table_name}/sample")
 async def get_sample_data(database_id: int, table_name: str, limit: int = 5, current_user: dict = Depends(get_current_user)):
-    import sqlite3
-    db = db_manager.get_system_row("SELECT file_path FROM databases WHERE id = ?", (database_id,))
+    db = await db_manager.aget_system_row("SELECT file_path FROM databases WHERE id = ?", (database_id,))
     if not db:
         raise HTTPException(status_code=404, detail="Database not found")
-    conn = sqlite3.connect(db["file_path"])
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute(f'SELECT * FROM "{table_name}" LIMIT ?', (limit,))
-    rows = [dict(r) for r in cursor.fetchall()]
-    conn.close()
-    return {"data": rows}
+    rows = await asyncio.to_thread(_fetch_sample, db["file_path"], table_name, limit)
+    return RowsResponse({"data": rows})
 
 
 # --- QUERY ROUTES ---
 
 @api_app.post("/api/query/nl")
 async def query_nl(data: NLQuery, current_user: dict = Depends(get_current_user)):
-    schema_row = db_manager.get_system_row(
-        "SELECT schema_json FROM schema_cache WHERE database_id = ? ORDER BY cached_at DESC LIMIT 1",
+    # File path and cached schema in one round-trip
+    db_row = await db_manager.aget_system_row(
+        """SELECT d.file_path, sc.id as schema_cache_id
+           FROM databases d
+           LEFT JOIN schema_cache sc ON sc.database_id = d.id
+           WHERE d.id = ?""",
         (data.databaseId,)
     )
-    if not schema_row:
+    if not db_row or db_row["schema_cache_id"] is None:
         raise HTTPException(status_code=404, detail="Schema not found")
+    schema = await asyncio.to_thread(_parsed_schema, db_row["schema_cache_id"])
 
-    schema = json.loads(schema_row["schema_json"])
     # Pass username and database path for logging and feedback loop
     username = current_user.get("username", "anonymous")
-    db_row = db_manager.get_system_row("SELECT file_path FROM databases WHERE id = ?", (data.databaseId,))
-    db_path = db_row["file_path"] if db_row else None
+    db_path = db_row["file_path"]
     
     result = await premium_nlp_service.process_query(
         data.query,
@@ -713,33 +1284,26 @@ async def query_nl(data: NLQuery, current_user: dict = Depends(get_current_user)
         # Use existing db_row from above
         if db_row:
             try:
-                import sqlite3
-                conn = sqlite3.connect(db_row["file_path"])
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
                 query_upper = sql.strip().upper()
-                is_read = query_upper.startswith("SELECT") or query_upper.startswith("PRAGMA") or query_upper.startswith("WITH")
+                is_read = query_upper.startswith(("SELECT", "PRAGMA", "WITH"))
                 
                 if is_read:
-                    cursor.execute(sql)
-                    rows = cursor.fetchall()
-                    data = [dict(r) for r in rows]
-                    result["result"] = data
+                    rows, truncated = await asyncio.to_thread(_run_select, db_row["file_path"], sql)
+                    result["result"] = rows
+                    result["truncated"] = truncated
                     
                     # Update explanation with actual data summary to avoid "silent success"
-                    count = len(data)
+                    count = len(rows)
                     prefix = f"**[Result: Found {count} records]**\n\n" if count > 0 else "**[Result: No records found matching the criteria]**\n\n"
                     result["explanation"] = prefix + (result.get("explanation") or "")
                     
-                    if not data:
+                    if not rows:
                         print(f"\n[INFO] Query ran but returned no data.")
                     else:
-                        print(f"\n[OK] DATA RETRIEVED: Found {len(data)} records.")
+                        print(f"\n[OK] DATA RETRIEVED: Found {len(rows)} records.")
                 else:
-                    cursor.execute(sql)
-                    changes = conn.total_changes
-                    conn.commit()
+                    changes = await asyncio.to_thread(_run_write, db_row["file_path"], sql)
+                    _invalidate_schema_memo(db_row["file_path"])
                     result["changes"] = changes
                     
                     # Update explanation for Write operations
@@ -751,20 +1315,11 @@ async def query_nl(data: NLQuery, current_user: dict = Depends(get_current_user)
                     if query_upper.startswith("INSERT"): op_type = "INSERT"
                     elif query_upper.startswith("DELETE"): op_type = "DELETE"
                     
-                    db_manager.run_system_query(
-                        "INSERT INTO commits (database_id, user_id, query_executed, rows_affected, operation_type) VALUES (?, ?, ?, ?, ?)",
-                        (data.databaseId, current_user["userId"], sql, changes, op_type)
-                    )
+                    _queue_commit(data.databaseId, current_user["userId"], sql, changes, op_type)
                     
                     # Refresh schema if it's a structural change
                     if any(x in query_upper for x in ["CREATE", "ALTER", "DROP", "RENAME"]):
-                        new_schema = _extract_schema(db_row["file_path"])
-                        db_manager.run_system_query(
-                            "INSERT INTO schema_cache (database_id, schema_json) VALUES (?, ?)",
-                            (data.databaseId, json.dumps(new_schema))
-                        )
-                
-                conn.close()
+                        await asyncio.to_thread(_extract_and_cache_schema, data.databaseId, db_row["file_path"])
             except Exception as e:
                 print(f"[ERROR] EXECUTION FAILED: {e}")
                 result["error"] = str(e)
@@ -772,70 +1327,69 @@ async def query_nl(data: NLQuery, current_user: dict = Depends(get_current_user)
 
     return result
 
+# Serialized suggestion payloads keyed by the schema_cache row they were built from
+SUGGEST_MEMO_SIZE = 256
+_suggest_memo = OrderedDict()  # schema_cache.id -> orjson bytes
+_suggest_memo_lock = threading.Lock()
+
+
 @api_app.get("/api/query/suggestions/{database_id}")
-async def get_suggestions(database_id: int, current_user: dict = Depends(get_current_user)):
+def get_suggestions(database_id: int, current_user: dict = Depends(get_current_user)):
     schema_row = db_manager.get_system_row(
-        "SELECT schema_json FROM schema_cache WHERE database_id = ? ORDER BY cached_at DESC LIMIT 1",
+        "SELECT id FROM schema_cache WHERE database_id = ?",
         (database_id,)
     )
-    if not schema_row:
+    if schema_row is None:
         return {"suggestions": []}
 
-    schema = json.loads(schema_row["schema_json"])
-    suggestions = []
-    for table in schema.get("tables", [])[:3]:
-        suggestions.append({"category": "View Data", "query": f"Show all data from {table['name']}", "description": f"View all {table.get('rowCount', 0)} records"})
-        suggestions.append({"category": "Count", "query": f"How many rows in {table['name']}?", "description": "Count total records"})
-    return {"suggestions": suggestions}
+    key = schema_row["id"]
+    with _suggest_memo_lock:
+        body = _suggest_memo.get(key)
+        if body is not None:
+            _suggest_memo.move_to_end(key)
+    if body is None:
+        schema = _parsed_schema(key) or {}
+        suggestions = []
+        for table in schema.get("tables", [])[:3]:
+            suggestions.append({"category": "View Data", "query": f"Show all data from {table['name']}", "description": f"View all {table.get('rowCount', 0)} records"})
+            suggestions.append({"category": "Count", "query": f"How many rows in {table['name']}?", "description": "Count total records"})
+        body = orjson.dumps({"suggestions": suggestions})
+        with _suggest_memo_lock:
+            _suggest_memo[key] = body
+            while len(_suggest_memo) > SUGGEST_MEMO_SIZE:
+                _suggest_memo.popitem(last=False)
+    return Response(content=body, media_type="application/json")
+
+
+# Leading keyword of a raw SQL statement; anything unrecognised is recorded as UPDATE.
+# A leading WITH runs on the read path like a SELECT
+_FIRST_WORD_RE = re.compile(r"\s*([A-Za-z]+)")
+_OP_BY_KEYWORD = {op: op for op in ("SELECT", "PRAGMA", "INSERT", "UPDATE", "DELETE", "CREATE", "ALTER", "DROP")}
+_OP_BY_KEYWORD["WITH"] = "SELECT"
 
 
 @api_app.post("/api/query/execute")
-async def execute_sql(data: SQLExecute, current_user: dict = Depends(get_current_user)):
-    db_row = db_manager.get_system_row("SELECT file_path FROM databases WHERE id = ?", (data.databaseId,))
+async def execute_sql(data: SQLExecute, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    db_row = await db_manager.aget_system_row("SELECT file_path FROM databases WHERE id = ?", (data.databaseId,))
     if not db_row:
         raise HTTPException(status_code=404, detail="Database not found")
         
     try:
-        import sqlite3
-        conn = sqlite3.connect(db_row["file_path"])
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        query_upper = data.query.strip().upper()
-        if query_upper.startswith("SELECT") or query_upper.startswith("PRAGMA"):
-            cursor.execute(data.query)
-            rows = cursor.fetchall()
-            result = [dict(r) for r in rows]
-            conn.close()
-            return {"success": True, "result": result, "queryType": "SELECT"}
+        m = _FIRST_WORD_RE.match(data.query)
+        keyword = m.group(1).upper() if m else ""
+        op_type = _OP_BY_KEYWORD.get(keyword, "UPDATE")
+        if op_type in ("SELECT", "PRAGMA"):
+            result, truncated = await asyncio.to_thread(_run_select, db_row["file_path"], data.query)
+            return RowsResponse({"success": True, "result": result, "queryType": "SELECT", "truncated": truncated})
         else:
-            cursor.execute(data.query)
-            changes = conn.total_changes
-            conn.commit()
-            conn.close()
-
-            # Record commit for history
-            op_type = "UPDATE"
-            if query_upper.startswith("INSERT"):
-                op_type = "INSERT"
-            elif query_upper.startswith("DELETE"):
-                op_type = "DELETE"
-            elif query_upper.startswith("CREATE"):
-                op_type = "CREATE"
+            changes = await asyncio.to_thread(_run_write, db_row["file_path"], data.query)
+            _invalidate_schema_memo(db_row["file_path"])
 
-            try:
-                db_manager.run_system_query(
-                    "INSERT INTO commits (database_id, user_id, query_executed, rows_affected, operation_type) VALUES (?, ?, ?, ?, ?)",
-                    (data.databaseId, current_user["userId"], data.query, changes, op_type)
-                )
-                # Refresh schema cache after write operations
-                schema = _extract_schema(db_row["file_path"])
-                db_manager.run_system_query(
-                    "INSERT INTO schema_cache (database_id, schema_json) VALUES (?, ?)",
-                    (data.databaseId, json.dumps(schema))
-                )
-            except Exception as commit_err:
-                logging.warning(f"Failed to record commit: {commit_err}")
+            # Record commit for history and refresh the schema cache after the response is sent;
+            # a plain UPDATE changes neither structure nor row counts
+            _queue_commit(data.databaseId, current_user["userId"], data.query, changes, op_type)
+            if keyword != "UPDATE":
+                background_tasks.add_task(_refresh_schema_cache, data.databaseId, db_row["file_path"])
 
             # Determine success message
             success_msg = f"{op_type.capitalize()} successful"
@@ -851,7 +1405,7 @@ async def execute_sql(data: SQLExecute, current_user: dict = Depends(get_current
 # --- HISTORY ROUTES ---
 
 @api_app.get("/api/history/{database_id}")
-async def get_history(database_id: int, current_user: dict = Depends(get_current_user)):
+def get_history(database_id: int, current_user: dict = Depends(get_current_user)):
     commits = db_manager.get_system_rows(
         "SELECT c.*, u.username FROM commits c JOIN users u ON c.user_id = u.id WHERE c.database_id = ? ORDER BY c.timestamp DESC LIMIT 50",
         (database_id,)
@@ -860,17 +1414,15 @@ async def get_history(database_id: int, current_user: dict = Depends(get_current
 
 
 @api_app.get("/api/history/{database_id}/stats")
-async def get_history_stats(database_id: int, current_user: dict = Depends(get_current_user)):
-    total = db_manager.get_system_row("SELECT COUNT(*) as count FROM commits WHERE database_id = ?", (database_id,))
-    
-    # Get operation distribution
+def get_history_stats(database_id: int, current_user: dict = Depends(get_current_user)):
+    # Operation distribution; the total is its sum
     ops = db_manager.get_system_rows(
         "SELECT operation_type, COUNT(*) as count FROM commits WHERE database_id = ? GROUP BY operation_type",
         (database_id,)
     )
     
     return {
-        "totalCommits": total["count"] if total else 0,
+        "totalCommits": sum(op["count"] for op in ops),
         "operationStats": ops
     }
 
@@ -879,7 +1431,7 @@ async def get_history_stats(database_id: int, current_user: dict = Depends(get_c
 # --- COLLABORATION ROUTES ---
 
 @api_app.get("/api/collaboration/{database_id}/collaborators")
-async def get_collaborators(database_id: int, current_user: dict = Depends(get_current_user)):
+def get_collaborators(database_id: int, current_user: dict = Depends(get_current_user)):
     collaborators = db_manager.get_system_rows(
         "SELECT dp.*, u.username, u.email FROM database_permissions dp JOIN users u ON dp.user_id = u.id WHERE dp.database_id = ?",
         (database_id,)
@@ -888,7 +1440,7 @@ async def get_collaborators(database_id: int, current_user: dict = Depends(get_c
 
 
 @api_app.post("/api/collaboration/{database_id}/collaborators")
-async def add_collaborator(database_id: int, data: dict = Body(...), current_user: dict = Depends(get_current_user)):
+def add_collaborator(database_id: int, data: dict = Body(...), current_user: dict = Depends(get_current_user)):
     user = db_manager.get_system_row("SELECT id FROM users WHERE email = ?", (data.get("userEmail"),))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -922,16 +1474,61 @@ async def leave_database(sid, database_id):
     await sio.leave_room(sid, f"db_{database_id}")
     await sio.emit('user-left', {'userId': 'some_id'}, room=f"db_{database_id}", skip_sid=sid)
 
+# Rapid query-executed events for a room are coalesced into one broadcast
+BROADCAST_DEBOUNCE = 0.1
+_pending_updates = {}  # room -> (set of sender sids, data of the latest event)
+_flush_handles = {}  # room -> asyncio.TimerHandle
+
+async def _flush_room(room):
+    handle = _flush_handles.pop(room, None)
+    if handle:
+        handle.cancel()
+    pending = _pending_updates.pop(room, None)
+    if pending:
+        senders, data = pending
+        # With several senders each must still hear about the others' changes,
+        # so only a lone sender is skipped
+        skip_sid = next(iter(senders)) if len(senders) == 1 else None
+        await sio.emit('database-updated', data, room=room, skip_sid=skip_sid)
+
 @sio.on('query-executed')
 async def query_executed(sid, data):
     database_id = data.get('databaseId')
-    await sio.emit('database-updated', data, room=f"db_{database_id}", skip_sid=sid)
+    room = f"db_{database_id}"
+    # Schema-changing operations are flagged important and go out immediately,
+    # after anything already coalesced for the room
+    if data.get('important'):
+        await _flush_room(room)
+        await sio.emit('database-updated', data, room=room, skip_sid=sid)
+        return
+    pending = _pending_updates.get(room)
+    senders = pending[0] if pending else set()
+    senders.add(sid)
+    _pending_updates[room] = (senders, data)
+    if room not in _flush_handles:
+        loop = asyncio.get_running_loop()
+        _flush_handles[room] = loop.call_later(BROADCAST_DEBOUNCE, lambda: asyncio.ensure_future(_flush_room(room)))
+
+TYPING_THROTTLE = 0.1
+_typing_last = {}  # sid -> {database_id: (monotonic time, isTyping)} of the last relayed event
+
+@sio.on('disconnect')
+async def disconnect(sid):
+    _typing_last.pop(sid, None)
 
 @sio.on('typing')
 async def typing(sid, data):
     # data is expected to be {'databaseId': ..., 'isTyping': ...}
     database_id = data.get('databaseId')
     is_typing = data.get('isTyping', True)
+
+    # Keystrokes repeat the same state; relay at most one per throttle window,
+    # but always pass a change of state through
+    now = time.monotonic()
+    last = _typing_last.setdefault(sid, {}).get(database_id)
+    if last and last[1] == is_typing and now - last[0] < TYPING_THROTTLE:
+        return
+    _typing_last[sid][database_id] = (now, is_typing)
     
     # We should ideally have the user info from the session, 
     # but for now we'll emit what the frontend expects
@@ -943,6 +1540,7 @@ async def typing(sid, data):
 
 @sio.on('stop-typing')
 async def stop_typing(sid, database_id):
+    _typing_last.get(sid, {}).pop(database_id, None)
     await sio.emit('typing', {
         'username': 'Collaborator',
         'isTyping': False,
@@ -4,18 +4,90 @@ Migration: Gemini -> Groq (Llama 3.3 70B)
 """
 
 import os
+import re
+import copy
 import json
+import asyncio
+import hashlib
 import logging
 import time
-import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq
+from connection_pool import user_db_pool, file_version
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Fixed keyword sets checked on every query
+GREETINGS = frozenset({"HI", "HELLO", "HEY", "GOOD MORNING", "GOOD AFTERNOON", "GREETINGS"})
+READ_PREFIXES = ("SELECT", "WITH", "PRAGMA")
+
+# Finished results for identical (query, schema, table, recent history) inputs
+RESPONSE_CACHE_SIZE = int(os.getenv("NLP_RESPONSE_CACHE_SIZE", "512"))
+SCHEMA_KEY_CACHE_SIZE = 64
+SAMPLE_TABLES = 10  # Limit to first 10 tables to avoid prompt bloat
+SAMPLE_ROWS = 3
+# Per-user history is append-only JSONL, compacted back to the newest entries
+# once it grows to HISTORY_COMPACT_AT lines
+HISTORY_MAX_ENTRIES = 100
+HISTORY_COMPACT_AT = 200
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s?.!]+$")
+
+
+def _normalize_query(user_query: str) -> str:
+    """Fold spacing and trailing punctuation so trivial rephrasings share a cache entry.
+
+    Case is kept: literal values in the request end up in the generated SQL.
+    """
+    return _TRAILING_PUNCT_RE.sub("", _WHITESPACE_RE.sub(" ", user_query.strip()))
+
+# Fixed instructions sent as the system message ahead of every request, so the
+# provider can reuse the cached prefix; schema, context and the question follow
+SYSTEM_PROMPT = """You are an Expert SQLite reasoning engine (Powered by LLaMA 3.3 70B). 
+You must handle both SQL generation and natural conversation with high precision.
+
+### ANALYST BRAIN:
+1. INTENT CLASSIFICATION: 
+   - DATABASE TASK: User asks for data, counts, or changes. Return SQL.
+   - CONVERSATION/KNOWLEDGE: Greetings, info about AI/LLM, etc. Return `SQL_QUERY: null`.
+   - RULE: If it's a CONVERSATION/KNOWLEDGE task, provide a FRIENDLY, COMPLETE, and HELPFUL answer in the `EXPLANATION` field (similar to ChatGPT). Do NOT just describe the user's intent. Answer them!
+2. DATA TYPES: Use `CAST(column AS NUMERIC)` for math on TEXT columns.
+3. SEARCH STRATEGY: ALWAYS use `UPPER(column) = UPPER('value')` for names.
+4. NO HALLUCINATION: Only use schema columns.
+
+### OUTPUT PROTOCOL:
+- SQL_QUERY: Set to `null` for chat/general questions. Set to SQL for database tasks.
+- EXPLANATION: 
+  - IF SQL_QUERY IS SQL: Keep explanation to ONE SHORT SENTENCE.
+  - IF SQL_QUERY IS NULL: Provide a HELPFUL, FRIENDLY, and COMPLETE response as a virtual assistant. Answer the user's question directly.
+"""
+
+def _fetch_samples(db_path: str) -> Dict:
+    sample_data = {}
+    with user_db_pool.acquire(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        tables = [r[0] for r in cursor.fetchall()]
+        for t in tables[:SAMPLE_TABLES]:
+            quoted = '"' + t.replace('"', '""') + '"'
+            cursor.execute(f'SELECT * FROM {quoted} LIMIT {SAMPLE_ROWS}')
+            cols = [d[0] for d in cursor.description]
+            sample_data[t] = [dict(zip(cols, row)) for row in cursor.fetchall()]
+    return sample_data
+
+
+def _validate_sql(db_path: str, sql: str):
+    """Raise if the model's SQL would fail; writes are only EXPLAINed"""
+    is_read = sql.strip().upper().startswith(READ_PREFIXES)
+    with user_db_pool.acquire(db_path) as conn:
+        conn.execute(sql if is_read else f"EXPLAIN {sql}").close()
+
+
 class ContextMemory:
     def __init__(self):
         self.user_contexts: Dict[str, Dict] = {}
@@ -59,15 +131,84 @@ class PremiumNLPService:
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.model_name = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+        # Bound a hung connection instead of stalling the request indefinitely
+        self.request_timeout = float(os.getenv("GROQ_TIMEOUT", "30"))
         
         if not self.api_key:
             logger.warning("GROQ_API_KEY not found in environment. AI features will be disabled.")
             self.client = None
         else:
-            self.client = Groq(api_key=self.api_key)
+            # One async client for the process: its HTTP connection pool stays warm
+            # across requests and calls no longer block the event loop
+            self.client = AsyncGroq(api_key=self.api_key, timeout=self.request_timeout)
             logger.info(f"Groq Client Initialized with model: {self.model_name}")
 
         self.context = ContextMemory()
+        self._response_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        # id(schema) -> (schema, digest); holding the schema keeps its id from being reused
+        self._schema_keys: "OrderedDict[int, tuple]" = OrderedDict()
+        self._schema_render_cache: "OrderedDict[str, List[tuple]]" = OrderedDict()
+        # db_path -> (file version, sample rows); reread only after the file changes
+        self._sample_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # One writer thread keeps appends in request order without locking
+        self._history_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+        self._history_lines: Dict[str, int] = {}
+
+    def _schema_key(self, schema: Dict) -> str:
+        """Content digest of a schema, computed once per schema object"""
+        entry = self._schema_keys.get(id(schema))
+        if entry is not None and entry[0] is schema:
+            self._schema_keys.move_to_end(id(schema))
+            return entry[1]
+        digest = hashlib.blake2b(
+            json.dumps(schema, sort_keys=True, default=str).encode(), digest_size=16
+        ).hexdigest()
+        self._schema_keys[id(schema)] = (schema, digest)
+        if len(self._schema_keys) > SCHEMA_KEY_CACHE_SIZE:
+            self._schema_keys.popitem(last=False)
+        return digest
+
+    def _render_tables(self, schema: Dict) -> List[tuple]:
+        """(name, "Table/Columns" block) per table, rendered once per schema"""
+        key = self._schema_key(schema)
+        blocks = self._schema_render_cache.get(key)
+        if blocks is not None:
+            self._schema_render_cache.move_to_end(key)
+            return blocks
+        blocks = []
+        for table in schema.get("tables", []):
+            columns = [f"{c['name']} ({c['type']})" for c in table.get("columns", [])]
+            blocks.append((table['name'], f"Table: {table['name']}\nColumns: {', '.join(columns)}"))
+        self._schema_render_cache[key] = blocks
+        if len(self._schema_render_cache) > SCHEMA_KEY_CACHE_SIZE:
+            self._schema_render_cache.popitem(last=False)
+        return blocks
+
+    async def _sample_data(self, db_path: str) -> Dict:
+        """First rows of the leading tables, memoized by the file's version"""
+        try:
+            version = file_version(db_path)
+        except OSError:
+            return {}
+        cached = self._sample_cache.get(db_path)
+        if cached is not None and cached[0] == version:
+            self._sample_cache.move_to_end(db_path)
+            return cached[1]
+        try:
+            sample_data = await asyncio.to_thread(_fetch_samples, db_path)
+        except Exception as e:
+            logger.warning(f"Could not fetch sample data for context: {e}")
+            return {}
+        self._sample_cache[db_path] = (version, sample_data)
+        if len(self._sample_cache) > SCHEMA_KEY_CACHE_SIZE:
+            self._sample_cache.popitem(last=False)
+        return sample_data
+
+    def _response_key(self, user_query: str, schema: Dict, active_table: Optional[str], history: Optional[List],
+                      username: str, sample_data: Dict, db_path: Optional[str]) -> str:
+        """Digest of the database plus the exact prompt the model would receive"""
+        prompt = self._build_prompt(_normalize_query(user_query), schema, active_table, history, username, sample_data=sample_data)
+        return hashlib.blake2b(json.dumps([db_path, prompt]).encode(), digest_size=16).hexdigest()
 
     async def process_query(
         self,
@@ -88,8 +229,7 @@ class PremiumNLPService:
         active_table = selected_table or self.context.get_active_table(username)
         
         # CONTEXT PURGE: If it's a fresh greeting, clear naming context to avoid carrying over old search terms
-        greetings = ["HI", "HELLO", "HEY", "GOOD MORNING", "GOOD AFTERNOON", "GREETINGS"]
-        if user_query.strip().upper() in greetings:
+        if user_query.strip().upper() in GREETINGS:
             self.context.user_contexts[username] = {
                 "active_table": active_table,
                 "last_query": None,
@@ -98,21 +238,17 @@ class PremiumNLPService:
             }
 
         # GATHER DATA AWARENESS...
-        sample_data = {}
-        if db_path and os.path.exists(db_path):
-            try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-                tables = [r[0] for r in cursor.fetchall()]
-                for t in tables[:10]: # Limit to first 10 tables to avoid prompt bloat
-                    cursor.execute(f'SELECT * FROM "{t}" LIMIT 3')
-                    cols = [d[0] for d in cursor.description]
-                    rows = cursor.fetchall()
-                    sample_data[t] = [dict(zip(cols, row)) for row in rows]
-                conn.close()
-            except Exception as e:
-                logger.warning(f"Could not fetch sample data for context: {e}")
+        sample_data = await self._sample_data(db_path) if db_path else {}
+
+        cache_key = self._response_key(user_query, schema, active_table, conversation_history, username, sample_data, db_path)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            self._response_cache.move_to_end(cache_key)
+            result = copy.deepcopy(cached)
+            result["cached"] = True
+            self.context.update(username, result.get("target_table") or active_table, user_query, result.get("query"))
+            self._log_to_history(username, user_query, result.get("query"))
+            return result
 
         # Initial attempt with Full Context
         result = await self._llm_process(user_query, schema, active_table, conversation_history, username, sample_data=sample_data)
@@ -128,19 +264,7 @@ class PremiumNLPService:
 
             try:
                 # Validation execution
-                conn = sqlite3.connect(db_path)
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                query_upper = sql.strip().upper()
-                is_read = any(query_upper.startswith(x) for x in ["SELECT", "WITH", "PRAGMA"])
-                
-                if is_read:
-                    cursor.execute(sql)
-                else:
-                    cursor.execute(f"EXPLAIN {sql}")
-                
-                conn.close()
+                await asyncio.to_thread(_validate_sql, db_path, sql)
                 logger.info(f"SQL Validated successfully: {sql[:50]}...")
                 
             except Exception as e:
@@ -161,44 +285,79 @@ class PremiumNLPService:
             result["type"] = "info"
 
         self.context.update(username, result.get("target_table") or active_table, user_query, final_sql)
+
+        if result.get("type") != "error":
+            cached = copy.deepcopy(result)
+            # Timing belongs to this model call, not to later hits
+            cached.pop("latency", None)
+            self._response_cache[cache_key] = cached
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
         
-        # PERSISTENT LOGGING TO history.json
+        # PERSISTENT LOGGING TO history.jsonl
         self._log_to_history(username, user_query, final_sql)
         
         return result
 
     def _log_to_history(self, username: str, user_query: str, sql_query: Optional[str]):
-        """Persists query history to a JSON file per user"""
+        """Queue a history entry; the file write happens off the event loop"""
+        entry = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "user_query": user_query,
+            "sql_query": sql_query,
+            "engine": "LLaMA-3.3-70B"
+        }
+        asyncio.get_running_loop().run_in_executor(self._history_executor, self._append_history, username, entry)
+
+    def _append_history(self, username: str, entry: Dict):
+        """Persists query history to a JSONL file per user"""
         try:
             log_dir = f"./logs/{username}"
-            os.makedirs(log_dir, exist_ok=True)
-            history_file = os.path.join(log_dir, "history.json")
-            
-            history = []
-            if os.path.exists(history_file):
+            history_file = os.path.join(log_dir, "history.jsonl")
+            lines = self._history_lines.get(username)
+            if lines is None:
+                os.makedirs(log_dir, exist_ok=True)
+                lines = self._count_history(log_dir, history_file)
+
+            with open(history_file, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            lines += 1
+
+            # Keep only the last entries per user to prevent file bloat
+            if lines >= HISTORY_COMPACT_AT:
                 with open(history_file, "r") as f:
-                    try:
-                        history = json.load(f)
-                    except json.JSONDecodeError:
-                        history = []
-
-            history.append({
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "user_query": user_query,
-                "sql_query": sql_query,
-                "engine": "LLaMA-3.3-70B"
-            })
-
-            # Keep only last 100 entries per user to prevent file bloat
-            if len(history) > 100:
-                history = history[-100:]
-
-            with open(history_file, "w") as f:
-                json.dump(history, f, indent=4)
-                
+                    recent = f.readlines()[-HISTORY_MAX_ENTRIES:]
+                tmp_file = history_file + ".tmp"
+                with open(tmp_file, "w") as f:
+                    f.writelines(recent)
+                os.replace(tmp_file, history_file)
+                lines = len(recent)
+            self._history_lines[username] = lines
+
         except Exception as e:
             logger.error(f"Failed to log history: {e}")
 
+    def _count_history(self, log_dir: str, history_file: str) -> int:
+        """Line count of an existing log, carrying over a legacy history.json once.
+
+        The legacy file is renamed to history.json.migrated rather than deleted.
+        """
+        if os.path.exists(history_file):
+            with open(history_file, "r") as f:
+                return sum(1 for _ in f)
+        legacy_file = os.path.join(log_dir, "history.json")
+        if not os.path.exists(legacy_file):
+            return 0
+        try:
+            with open(legacy_file, "r") as f:
+                history = json.load(f)
+        except json.JSONDecodeError:
+            history = []
+        with open(history_file, "w") as f:
+            f.writelines(json.dumps(item) + "\n" for item in history)
+        os.replace(legacy_file, legacy_file + ".migrated")
+        return len(history)
+
     async def _llm_process(
         self,
         user_query: str,
@@ -216,9 +375,12 @@ class PremiumNLPService:
         prompt = self._build_prompt(user_query, schema, active_table, conversation_history, username, error_feedback, failed_sql, sample_data)
 
         try:
-            completion = self.client.chat.completions.create(
+            completion = await self.client.chat.completions.create(
                 model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
                 temperature=0.0, # ZERO temperature for maximum logic stability
                 max_tokens=2048,
                 response_format={"type": "json_object"} if "format: json" in prompt.lower() else None
@@ -289,11 +451,7 @@ class PremiumNLPService:
     def _build_prompt(self, user_query, schema, active_table, history, username, error_feedback=None, failed_sql=None, sample_data=None) -> str:
         # Schema String
         tables_info = []
-        for table in schema.get("tables", []):
-            name = table['name']
-            columns = [f"{c['name']} ({c['type']})" for c in table.get("columns", [])]
-            info = f"Table: {name}\nColumns: {', '.join(columns)}"
-            
+        for name, info in self._render_tables(schema):
             # Inject Data Awareness if sample rows exist
             if sample_data and name in sample_data:
                 rows = sample_data[name]
@@ -313,31 +471,14 @@ class PremiumNLPService:
         if error_feedback:
             feedback_block = f"\n\nCRITICAL: Previous SQL failed: {failed_sql}\nError: {error_feedback}\nFix the logic with priority."
 
-        return f"""You are an Expert SQLite reasoning engine (Powered by LLaMA 3.3 70B). 
-You must handle both SQL generation and natural conversation with high precision.
-
-### ANALYST BRAIN:
-1. INTENT CLASSIFICATION: 
-   - DATABASE TASK: User asks for data, counts, or changes. Return SQL.
-   - CONVERSATION/KNOWLEDGE: Greetings, info about AI/LLM, etc. Return `SQL_QUERY: null`.
-   - RULE: If it's a CONVERSATION/KNOWLEDGE task, provide a FRIENDLY, COMPLETE, and HELPFUL answer in the `EXPLANATION` field (similar to ChatGPT). Do NOT just describe the user's intent. Answer them!
-2. DATA TYPES: Use `CAST(column AS NUMERIC)` for math on TEXT columns.
-3. SEARCH STRATEGY: ALWAYS use `UPPER(column) = UPPER('value')` for names.
-4. NO HALLUCINATION: Only use schema columns.
-
-### DATABASE SCHEMA & SAMPLES:
+        # Only the per-request parts; the fixed instructions go in SYSTEM_PROMPT
+        return f"""### DATABASE SCHEMA & SAMPLES:
 {schema_str}
 
 ### CONTEXT:
 User: {username} | Active Table: {active_table or "None"}
 {history_str}{feedback_block}
 
-### OUTPUT PROTOCOL:
-- SQL_QUERY: Set to `null` for chat/general questions. Set to SQL for database tasks.
-- EXPLANATION: 
-  - IF SQL_QUERY IS SQL: Keep explanation to ONE SHORT SENTENCE.
-  - IF SQL_QUERY IS NULL: Provide a HELPFUL, FRIENDLY, and COMPLETE response as a virtual assistant. Answer the user's question directly.
-
 USER: "{user_query}"
 """
 